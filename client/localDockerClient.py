@@ -93,6 +93,26 @@ class LocalDockerClient(SandboxClient):
         except docker.errors.APIError as e:
             raise RuntimeError(f"Failed to delete container '{name}': {str(e)}")
 
+    def published_ports(self, prefix: str = "sandbox-") -> List[int]:
+        """
+        Host ports bound by existing containers whose name starts with prefix,
+        stopped ones included since they keep their bindings on restart.
+        """
+        ports = []
+        try:
+            containers = self.client.containers.list(all=True, filters={"name": prefix})
+        except docker.errors.APIError as e:
+            raise RuntimeError(f"Failed to list containers: {e}")
+        for container in containers:
+            if not container.name.startswith(prefix):
+                continue
+            bindings = container.attrs.get("HostConfig", {}).get("PortBindings") or {}
+            for binds in bindings.values():
+                for bind in binds or []:
+                    if bind.get("HostPort"):
+                        ports.append(int(bind["HostPort"]))
+        return ports
+
     @staticmethod
     def exec_command(container: Container, command: Union[str, List[str]], workdir: Optional[str] = None) -> str:
         """
@@ -1,13 +1,30 @@
 
+import os
+import threading
+
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, List, Optional, Tuple, Union
 
 from client import LocalDockerClient, KubernetesClient, get_client
+from utils.http_pool import LatencyStats, SandboxHttpPool
+from utils.port_allocator import PortAllocator
+from utils.workspace_changes import build_changes_command, new_token, parse_changes_output
+
+
+# port the service inside a sandbox listens on
+SANDBOX_SERVICE_PORT = 8080
+# Docker errors for a host port already bound, by a container or a host process
+PORT_CONFLICT_ERRORS = ("port is already allocated", "address already in use")
 
 
 class Sandbox(ABC):
     def __init__(self, name: str):
         self.name = name
+        self.max_connections = 16
+        self._http_pool = None
+        self._http_pool_lock = threading.Lock()
+        # kept on the sandbox so stats survive close() dropping the pool
+        self._request_stats = LatencyStats()
 
     @abstractmethod
     def exec_command(self, command: str) -> str:
@@ -17,12 +34,68 @@ class Sandbox(ABC):
     def exec_command_stream(self, command: str, workdir: Optional[str] = None) -> str:
         pass
 
+    @abstractmethod
+    def address(self) -> Tuple[str, int]:
+        """
+        (ip, port) the sandbox service is reachable on from the manager.
+        """
+        pass
+
+    def request(self,
+                endpoint: str = "",
+                payload: Optional[Union[Dict, str]] = None,
+                headers: Dict = {"Content-Type": "application/json"},
+                method: str = "POST") -> Dict:
+        """
+        Send a request to the sandbox service over a keep-alive connection pool.
+        """
+        pool = self._http_pool
+        if pool is None:
+            # one pool per sandbox, concurrent first callers must not each build their own
+            with self._http_pool_lock:
+                if self._http_pool is None:
+                    ip, port = self.address()
+                    self._http_pool = SandboxHttpPool(ip, port,
+                                                      max_connections=self.max_connections,
+                                                      stats=self._request_stats)
+                pool = self._http_pool
+        return pool.request(endpoint, payload, headers=headers, method=method)
+
+    def request_stats(self) -> Dict:
+        """
+        Count, errors and latency percentiles of requests sent by `request`,
+        same keys before the first request (values None) and kept across close().
+        """
+        return self._request_stats.summary()
+
+    def changes(self,
+                since: Optional[str] = None,
+                root: str = "/workspace",
+                ignore: List[str] = [".git"],
+                keep: int = 8) -> Dict:
+        """
+        Files added, modified or deleted under root since the token returned by
+        a previous call. Without `since` only a baseline token is returned.
+        Tokens are per root and only the `keep` newest are kept; an unknown or
+        expired `since` raises ChangesTokenExpired carrying a fresh baseline token.
+        """
+        token = new_token()
+        output = self.exec_command(build_changes_command(root, token, since=since, ignore=ignore, keep=keep))
+        return parse_changes_output(output, token, since=since, root=root)
+
+    def close(self) -> None:
+        with self._http_pool_lock:
+            if self._http_pool is not None:
+                self._http_pool.close()
+                self._http_pool = None
+
 
 class LocalContainerSandbox(Sandbox):
-    def __init__(self, cli, container, name: str):
+    def __init__(self, cli, container, name: str, host_port: int = None):
         super().__init__(name)
         self.cli = cli
         self.container = container
+        self.host_port = host_port
     
     def exec_command(self, command):
         return LocalDockerClient.exec_command(
@@ -37,11 +110,17 @@ class LocalContainerSandbox(Sandbox):
             command
         )
 
+    def address(self):
+        if self.host_port is None:
+            raise RuntimeError(f"Sandbox '{self.name}' has no published host port.")
+        return os.getenv("SANDBOX_HOST_IP", "127.0.0.1"), self.host_port
+
 class KubernetesSandbox(Sandbox):
-    def __init__(self, core_api, pod, name: str):
+    def __init__(self, core_api, pod, name: str, sandbox_port: int = SANDBOX_SERVICE_PORT):
         super().__init__(name)
         self.cli = core_api
         self.pod = pod
+        self.sandbox_port = sandbox_port
     
     def exec_command(self, command):
         return KubernetesClient.exec_command(
@@ -57,6 +136,12 @@ class KubernetesSandbox(Sandbox):
             command
         )
 
+    def address(self):
+        pod_ip = self.pod.status.pod_ip if self.pod.status else None
+        if not pod_ip:
+            raise RuntimeError(f"Sandbox '{self.name}' has no pod IP assigned.")
+        return pod_ip, self.sandbox_port
+
 sandbox_mapping = {
     "local_container": LocalContainerSandbox,
     "kubernetes": KubernetesSandbox,
@@ -64,37 +149,67 @@ sandbox_mapping = {
 
 
 class sandboxManager(object):
-    def __init__(self, ):
+    def __init__(self, port_range: Tuple[int, int] = (20000, 30000)):
         self.client, self.env_type = get_client()
+        self.port_allocator = PortAllocator(*port_range)
+        if self.env_type == "local_container":
+            # ports held by sandboxes that outlived a previous manager
+            for port in self.client.published_ports(prefix="sandbox-"):
+                self.port_allocator.reserve(port)
 
     def create_sandbox(self, 
                        image: str, 
                        name: str, 
                        command: str, 
                        sandbox_port: int = None, 
-                       mount_path: str = None) -> Sandbox:
+                       mount_path: str = None,
+                       max_retries: int = 3) -> Sandbox:
+        """
+        Docker: sandbox_port is the host port, allocated from the manager's pool when None.
+        Kubernetes: sandbox_port is the container port, SANDBOX_SERVICE_PORT when None.
+        """
         if not name.startswith("sandbox-"):
             name = "sandbox-" + name
+        if max_retries < 1:
+            raise ValueError(f"max_retries must be at least 1, got {max_retries}")
 
         sandbox_cls = sandbox_mapping.get(self.env_type)
         if sandbox_cls is None:
             raise RuntimeError(f"[Error] No sandbox implementation for type: {self.env_type}")
         
         if self.env_type == "local_container":
-            # Docker: host_port -> sandbox_port, container_port = 8080
-            cli, conta = self.client.create(image, name, command, 
-                                     host_port = sandbox_port, 
-                                     container_port = 8080, 
-                                     host_dir = mount_path, 
-                                     container_dir = "/workspace")
-            sandbox = sandbox_cls(cli, conta, name)
+            # Docker: host_port -> sandbox_port, container_port = SANDBOX_SERVICE_PORT
+            for attempt in range(max_retries):
+                if sandbox_port is None:
+                    host_port = self.port_allocator.allocate()
+                else:
+                    host_port = sandbox_port
+                    if not self.port_allocator.reserve(host_port):
+                        raise RuntimeError(f"[Error] Port {host_port} is already used by another sandbox.")
+                try:
+                    cli, conta = self.client.create(image, name, command, 
+                                             host_port = host_port, 
+                                             container_port = SANDBOX_SERVICE_PORT, 
+                                             host_dir = mount_path, 
+                                             container_dir = "/workspace")
+                    break
+                except RuntimeError as e:
+                    self.port_allocator.release(host_port)
+                    # port taken outside the allocator's knowledge, try the next one
+                    conflict = any(msg in str(e).lower() for msg in PORT_CONFLICT_ERRORS)
+                    if sandbox_port is None and conflict and attempt + 1 < max_retries:
+                        print(f"Port {host_port} already allocated, retrying.")
+                        continue
+                    raise
+            sandbox = sandbox_cls(cli, conta, name, host_port = host_port)
         elif self.env_type == "kubernetes":
             # Kubernetes: container_port = sandbox_port
+            sandbox_port = sandbox_port or SANDBOX_SERVICE_PORT
             core_api, pod = self.client.create(image, name, command, 
                                      container_port = sandbox_port, 
                                      host_dir = mount_path, 
                                      container_dir = "/workspace")
-            sandbox = sandbox_cls(core_api, pod, name)
+            sandbox = sandbox_cls(core_api, pod, name, sandbox_port = sandbox_port)
         else:
             raise RuntimeError(f"[Error] Unsupported sandbox environment type: {self.env_type}")
 
@@ -104,4 +219,11 @@ class sandboxManager(object):
         name = sandbox.name
         if not name.startswith("sandbox-"):
             name = "sandbox-" + name
-        self.client.delete(name)
+        sandbox.close()
+        try:
+            self.client.delete(name)
+        finally:
+            # reclaim the port even if the container is already gone
+            if isinstance(sandbox, LocalContainerSandbox):
+                self.port_allocator.release(sandbox.host_port)
+                sandbox.host_port = None
@@ -0,0 +1,119 @@
+import json
+import time
+import threading
+import traceback
+import urllib3
+
+from typing import Dict, Optional, Union
+
+from utils.latency import LatencyHistogram
+
+
+HTTP_POOL_TIMEOUT = urllib3.Timeout(connect=10, read=60 * 60)
+
+
+class LatencyStats(object):
+    def __init__(self):
+        """
+        Thread safe request counters plus a latency histogram.
+        """
+        self._lock = threading.Lock()
+        self._histogram = LatencyHistogram()
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds: float, success: bool) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self._histogram.record(seconds)
+            if not success:
+                self.errors += 1
+
+    def summary(self) -> Dict:
+        """
+        Same keys whether or not any request was recorded, latency in milliseconds.
+        """
+        with self._lock:
+            output = {
+                "count": self.count,
+                "errors": self.errors,
+                "mean_ms": self.total_seconds / self.count * 1000 if self.count else None,
+            }
+            output.update(self._histogram.summary())
+        return output
+
+
+class SandboxHttpPool(object):
+    def __init__(self,
+                 ip: str,
+                 port: int,
+                 max_connections: int = 16,
+                 pool_timeout: Optional[float] = None,
+                 stats: Optional[LatencyStats] = None):
+        """
+        Keep-alive connection pool to one sandbox service.
+        At most `max_connections` requests are in flight, further callers block
+        until a connection is returned (or `pool_timeout` expires).
+        """
+        self.ip = ip
+        self.port = port
+        self.pool_timeout = pool_timeout
+        self.pool = urllib3.HTTPConnectionPool(
+            ip, port,
+            maxsize=max_connections,
+            block=True,
+            timeout=HTTP_POOL_TIMEOUT,
+            retries=False,
+        )
+        self.stats = stats if stats is not None else LatencyStats()
+
+    def request(self,
+                endpoint: str = "",
+                payload: Optional[Union[Dict, str]] = None,
+                headers: Dict = {"Content-Type": "application/json"},
+                method: str = "POST") -> Dict:
+        """
+        Send one request over a pooled connection.
+        Same output layout as utils.http_request.async_request.
+        """
+        if not endpoint.startswith("/"):
+            endpoint = "/" + endpoint
+        body = payload if payload is None or isinstance(payload, str) else json.dumps(payload)
+
+        output = dict()
+        start = time.perf_counter()
+        try:
+            response = self.pool.urlopen(
+                method, endpoint,
+                body=body,
+                headers=headers,
+                pool_timeout=self.pool_timeout,
+            )
+            text = response.data.decode()
+            if response.status == 200:
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = {"text": text}
+                if isinstance(data, dict):
+                    output.update(data)
+                else:
+                    output["data"] = data
+                output["status"] = 200
+                output["success"] = True
+                output["error"] = ""
+            else:
+                output["status"] = response.status
+                output["success"] = False
+                output["error"] = str(response.reason or "")
+        except Exception:
+            output["status"] = None
+            output["success"] = False
+            output["error"] = traceback.format_exc()
+        self.stats.record(time.perf_counter() - start, output["success"])
+        return output
+
+    def close(self) -> None:
+        self.pool.close()
@@ -0,0 +1,55 @@
+import math
+
+from typing import Dict, Optional
+
+
+class LatencyHistogram(object):
+    def __init__(self, precision: float = 0.01):
+        """
+        HDR-style histogram: log-spaced buckets with bounded relative error,
+        so recording is O(1) and memory does not grow with request count.
+        Not thread safe, callers sharing one across threads hold their own lock.
+        """
+        self._log_base = math.log1p(precision)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        us = max(seconds * 1e6, 1.0)
+        idx = int(math.log(us) / self._log_base)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for idx, n in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + n
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the p-th percentile, in milliseconds.
+        """
+        if not self.count:
+            return None
+        target = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= target:
+                return min(math.exp((idx + 1) * self._log_base) / 1e3, self.max * 1e3)
+        return self.max * 1e3
+
+    def summary(self) -> Dict:
+        """
+        Percentiles in milliseconds, None while empty.
+        """
+        return {
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max * 1e3 if self.count else None,
+        }
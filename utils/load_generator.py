@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import traceback
+import aiohttp
+
+from aiohttp import web
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from utils.latency import LatencyHistogram
+
+
+# per request, a request still pending after this counts as an error
+REPLAY_TIMEOUT = 60
+
+
+class ReplayStats(object):
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.error_kinds: Dict[str, int] = {}     # "http_503", "TimeoutError", ...
+        self.histogram = LatencyHistogram()
+        # how late the client fired requests, the generator's own overload
+        self.lag_seconds = 0.0
+        self.lag_max = 0.0
+
+    def record_lag(self, seconds: float) -> None:
+        self.lag_seconds += seconds
+        self.lag_max = max(self.lag_max, seconds)
+
+    def record_error(self, kind: str) -> None:
+        self.errors += 1
+        self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+
+    def merge(self, other: "ReplayStats") -> None:
+        self.sent += other.sent
+        self.completed += other.completed
+        self.errors += other.errors
+        self.dropped += other.dropped
+        self.lag_seconds += other.lag_seconds
+        self.lag_max = max(self.lag_max, other.lag_max)
+        for kind, n in other.error_kinds.items():
+            self.error_kinds[kind] = self.error_kinds.get(kind, 0) + n
+        self.histogram.merge(other.histogram)
+
+    def to_dict(self, seconds: float) -> Dict:
+        line = {
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "error_kinds": dict(self.error_kinds),
+            # throughput counts every completed request, success_rps only status 200
+            "throughput_rps": self.completed / seconds if seconds > 0 else None,
+            "success_rps": (self.completed - self.errors) / seconds if seconds > 0 else None,
+            "schedule_lag_mean_ms": self.lag_seconds / self.sent * 1e3 if self.sent else None,
+            "schedule_lag_max_ms": self.lag_max * 1e3 if self.sent else None,
+        }
+        line.update(self.histogram.summary())
+        return line
+
+
+def iter_trace(path: str) -> Iterator[Dict]:
+    """
+    Lazily read a JSONL trace, one request per line.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON on line {line_no} of '{path}': {e}")
+
+
+def iter_schedule(records: Iterator[Dict],
+                  mode: str = "poisson",
+                  rate: float = 10.0,
+                  speedup: float = 1.0,
+                  timestamp_key: str = "timestamp",
+                  seed: Optional[int] = None) -> Iterator[Tuple[float, Dict]]:
+    """
+    Attach a send offset (seconds from start) to each record.
+    poisson: exponential inter-arrival gaps with mean 1 / rate.
+    timestamp: record[timestamp_key] relative to the first record, divided by speedup.
+    """
+    if mode == "poisson":
+        if rate <= 0:
+            raise ValueError("rate must be positive for poisson mode.")
+        rng = random.Random(seed)
+        offset = 0.0
+        for record in records:
+            yield offset, record
+            offset += rng.expovariate(rate)
+    elif mode == "timestamp":
+        if speedup <= 0:
+            raise ValueError("speedup must be positive for timestamp mode.")
+        first = None
+        for record in records:
+            if timestamp_key not in record:
+                raise ValueError(f"Trace record has no '{timestamp_key}' field: {record}")
+            ts = float(record[timestamp_key])
+            if first is None:
+                first = ts
+            yield max(0.0, (ts - first) / speedup), record
+    else:
+        raise ValueError(f"Unsupported schedule mode: {mode}")
+
+
+def sandbox_targets(sandboxes: List) -> List[str]:
+    """
+    Base urls of sandbox services, see Sandbox.address.
+    """
+    targets = []
+    for sandbox in sandboxes:
+        ip, port = sandbox.address()
+        targets.append(f"http://{ip}:{port}")
+    return targets
+
+
+async def _send(session: aiohttp.ClientSession,
+                url: str,
+                payload: Dict,
+                headers: Dict,
+                scheduled: float,
+                stats_ref: List[ReplayStats]) -> None:
+    loop = asyncio.get_running_loop()
+    error = None
+    try:
+        async with session.post(url=url, json=payload, headers=headers) as response:
+            await response.read()
+            if response.status != 200:
+                error = f"http_{response.status}"
+    except Exception as e:
+        error = type(e).__name__
+    # latency from the scheduled send time, so a backed up client is not hidden
+    latency = loop.time() - scheduled
+    stats = stats_ref[0]
+    stats.completed += 1
+    if error is None:
+        stats.histogram.record(latency)
+    else:
+        stats.record_error(error)
+
+
+async def replay_trace(targets: List[str],
+                       trace_path: str,
+                       output: Optional[TextIO] = None,
+                       endpoint: str = "",
+                       headers: Dict = {"Content-Type": "application/json"},
+                       mode: str = "poisson",
+                       rate: float = 10.0,
+                       speedup: float = 1.0,
+                       window: float = 1.0,
+                       max_in_flight: int = 1024,
+                       limit: Optional[int] = None,
+                       duration: Optional[float] = None,
+                       seed: Optional[int] = None,
+                       timeout: float = REPLAY_TIMEOUT) -> Dict:
+    """
+    Open-loop replay: requests are fired on schedule whatever the number still
+    in flight, round robin over targets. Requests beyond max_in_flight are
+    dropped and counted instead of delaying the schedule. schedule_lag_*_ms
+    shows how late the client itself fired requests; a large lag means the
+    generator, not the target, is the bottleneck.
+    A "window" line is written to output every `window` seconds and a
+    "summary" line at the end.
+
+    A trace record is sent as is, unless it has a "payload" field; an
+    "endpoint" field overrides the endpoint argument.
+    """
+    if not targets:
+        raise ValueError("At least one target is required.")
+    endpoint = endpoint.lstrip("/")
+    targets = [t.rstrip("/") for t in targets]
+
+    loop = asyncio.get_running_loop()
+    total = ReplayStats()
+    stats_ref = [ReplayStats()]     # current window, swapped by the reporter
+    in_flight = set()
+    start = loop.time()
+    last_flush = [start]
+
+    def write(line: Dict) -> None:
+        if output is not None:
+            output.write(json.dumps(line) + "\n")
+            output.flush()
+
+    def flush_window() -> None:
+        now = loop.time()
+        current, stats_ref[0] = stats_ref[0], ReplayStats()
+        total.merge(current)
+        line = {"type": "window", "t": round(now - start, 3), "in_flight": len(in_flight)}
+        line.update(current.to_dict(now - last_flush[0]))
+        write(line)
+        last_flush[0] = now
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(window)
+            flush_window()
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(timeout=client_timeout, connector=connector) as session:
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            schedule = iter_schedule(iter_trace(trace_path), mode=mode, rate=rate, speedup=speedup, seed=seed)
+            for i, (offset, record) in enumerate(schedule):
+                if limit is not None and i >= limit:
+                    break
+                if duration is not None and offset > duration:
+                    break
+                scheduled = start + offset
+                # always yield, so sends, completions and the reporter keep
+                # running when the schedule is behind
+                await asyncio.sleep(max(scheduled - loop.time(), 0))
+
+                stats_ref[0].sent += 1
+                stats_ref[0].record_lag(max(0.0, loop.time() - scheduled))
+                if len(in_flight) >= max_in_flight:
+                    stats_ref[0].dropped += 1
+                    continue
+                payload = record.get("payload", record) if isinstance(record, dict) else record
+                path = (record.get("endpoint", endpoint) if isinstance(record, dict) else endpoint).lstrip("/")
+                url = f"{targets[i % len(targets)]}/{path}"
+                task = asyncio.create_task(_send(session, url, payload, headers, scheduled, stats_ref))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+        finally:
+            reporter_task.cancel()
+            try:
+                await reporter_task
+            except asyncio.CancelledError:
+                pass
+
+    # tail of the last window
+    flush_window()
+    end = loop.time()
+    summary = {"type": "summary", "t": round(end - start, 3), "targets": targets}
+    summary.update(total.to_dict(end - start))
+    write(summary)
+    return summary
+
+
+async def _stub_handler(request: web.Request) -> web.Response:
+    """
+    Echo the payload back, after sleeping payload["delay"] seconds if given.
+    """
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = {}
+    delay = payload.get("delay", 0) if isinstance(payload, dict) else 0
+    if delay:
+        await asyncio.sleep(float(delay))
+    return web.json_response({"echo": payload})
+
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, int]:
+    """
+    Local echo server for self-tests, port 0 picks a free port.
+    Stop it with `await runner.cleanup()`.
+    """
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", _stub_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    site = web.SockSite(runner, sock)
+    await site.start()
+    return runner, sock.getsockname()[1]
+
+
+async def self_test(requests_num: int = 500, rate: float = 200.0) -> Dict:
+    """
+    Replay a generated trace against the stub server and check every request completed.
+    """
+    runner, port = await start_stub_server()
+    trace_path = None
+    try:
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            trace_path = f.name
+            for i in range(requests_num):
+                f.write(json.dumps({"id": i, "delay": 0.01}) + "\n")
+        summary = await replay_trace([f"http://127.0.0.1:{port}"], trace_path,
+                                     output=sys.stdout, mode="poisson", rate=rate, seed=0)
+    finally:
+        await runner.cleanup()
+        if trace_path is not None:
+            os.unlink(trace_path)
+    if summary["completed"] != requests_num or summary["errors"]:
+        raise RuntimeError(f"Self-test failed: {summary}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop JSONL trace replay against sandbox services.")
+    parser.add_argument("--trace", help="JSONL trace, one request per line")
+    parser.add_argument("--target", action="append", default=[], help="base url, e.g. http://10.0.0.5:8080, repeatable")
+    parser.add_argument("--endpoint", default="")
+    parser.add_argument("--mode", choices=["poisson", "timestamp"], default="poisson")
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second in poisson mode")
+    parser.add_argument("--speedup", type=float, default=1.0, help="time compression in timestamp mode")
+    parser.add_argument("--window", type=float, default=1.0, help="report window in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1024)
+    parser.add_argument("--limit", type=int, default=None, help="max requests to send")
+    parser.add_argument("--duration", type=float, default=None, help="max seconds of trace to replay")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=REPLAY_TIMEOUT, help="per request timeout in seconds")
+    parser.add_argument("--output", default=None, help="JSONL results file, stdout if omitted")
+    parser.add_argument("--self-test", action="store_true", help="replay against a local stub server")
+    args = parser.parse_args()
+
+    if args.self_test:
+        asyncio.run(self_test())
+        return
+    if not args.trace or not args.target:
+        parser.error("--trace and --target are required")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(replay_trace(
+            args.target, args.trace,
+            output = output,
+            endpoint = args.endpoint,
+            mode = args.mode,
+            rate = args.rate,
+            speedup = args.speedup,
+            window = args.window,
+            max_in_flight = args.max_in_flight,
+            limit = args.limit,
+            duration = args.duration,
+            seed = args.seed,
+            timeout = args.timeout))
+    except Exception:
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import threading
+
+from typing import Optional, Set
+
+
+class PortAllocator(object):
+    def __init__(self, start: int = 20000, end: int = 30000):
+        """
+        Hand out host ports from [start, end) and reclaim them on release.
+        Safe to share between threads creating sandboxes concurrently.
+        Only tracks its own bookkeeping: the manager may run in another network
+        namespace than the Docker host, so ports are not probed locally. Seed
+        it with `reserve` and let Docker report the remaining collisions.
+        """
+        if not 0 < start < end <= 65536:
+            raise ValueError(f"Invalid port range: [{start}, {end})")
+        self.start = start
+        self.end = end
+        self._lock = threading.Lock()
+        self._in_use: Set[int] = set()
+        self._cursor = start
+
+    def allocate(self) -> int:
+        """
+        Reserve the next free port, round robin over the range so a port just
+        released is not immediately handed out again.
+        """
+        with self._lock:
+            size = self.end - self.start
+            for i in range(size):
+                port = self.start + (self._cursor - self.start + i) % size
+                if port in self._in_use:
+                    continue
+                self._in_use.add(port)
+                self._cursor = self.start + (port - self.start + 1) % size
+                return port
+        raise RuntimeError(f"No free port left in range [{self.start}, {self.end}).")
+
+    def reserve(self, port: int) -> bool:
+        """
+        Mark a caller-chosen port as used. Return False if it is already taken.
+        """
+        with self._lock:
+            if port in self._in_use:
+                return False
+            self._in_use.add(port)
+            return True
+
+    def release(self, port: Optional[int]) -> None:
+        """
+        Return a port to the pool, unknown ports are ignored.
+        """
+        if port is None:
+            return
+        with self._lock:
+            self._in_use.discard(port)
+
+    def in_use(self) -> Set[int]:
+        with self._lock:
+            return set(self._in_use)
@@ -0,0 +1,110 @@
+import re
+import shlex
+import uuid
+import hashlib
+
+from typing import Dict, List, Optional
+
+
+# manifests live inside the sandbox, so only the delta crosses exec output,
+# one subdirectory per root so tokens of different roots never mix
+MANIFEST_DIR = "/tmp/.sandbox_changes"
+UNKNOWN_TOKEN = "__unknown_token__"
+UNKNOWN_ROOT = "__unknown_root__"
+SNAPSHOT_FAILED = "__snapshot_failed__"
+
+_TOKEN_RE = re.compile(r"^[0-9a-f]{1,32}$")
+
+# old manifest first, new one second: "path\tsize\tmtime" per line
+_DIFF_AWK = (
+    "FILENAME == ARGV[1] { old[$1] = $2 FS $3; next } "
+    "{ if (!($1 in old)) print \"A\\t\" $1; "
+    "else if (old[$1] != $2 FS $3) print \"M\\t\" $1; "
+    "delete old[$1] } "
+    "END { for (p in old) print \"D\\t\" p }"
+)
+
+
+class ChangesTokenExpired(ValueError):
+    def __init__(self, message: str, token: str):
+        """
+        `since` is unknown for this root. `token` is the fresh baseline taken
+        by the failed call, pass it as `since` next time.
+        """
+        super().__init__(message)
+        self.token = token
+
+
+def new_token() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _manifest_dir(root: str) -> str:
+    return f"{MANIFEST_DIR}/{hashlib.sha1(root.encode()).hexdigest()[:16]}"
+
+
+def build_changes_command(root: str,
+                          token: str,
+                          since: Optional[str] = None,
+                          ignore: List[str] = [".git"],
+                          keep: int = 8) -> str:
+    """
+    Shell command that snapshots a size/mtime manifest of root as `token` and,
+    when `since` is given, prints the A/M/D lines against that manifest.
+    Only the `keep` newest manifests of root are kept. Entries named in
+    `ignore` are pruned at any depth, the manifest store always is.
+    A failing find (e.g. no -printf support) exits non-zero instead of
+    producing an empty manifest that would read as "no changes".
+    """
+    for t in (token, since):
+        if t is not None and not _TOKEN_RE.match(t):
+            raise ValueError(f"Invalid changes token: {t}")
+
+    root = root.rstrip("/") or "/"
+    prune = " -o ".join([f"-path {shlex.quote(MANIFEST_DIR)}"] + [f"-name {shlex.quote(name)}" for name in ignore])
+    manifest_dir = shlex.quote(_manifest_dir(root))
+    new = f"{manifest_dir}/{token}"
+
+    lines = [
+        "set -o pipefail",
+        f"if [ ! -d {shlex.quote(root)} ]; then echo {UNKNOWN_ROOT}; exit 0; fi",
+        f"mkdir -p {manifest_dir} || exit 1",
+        f"find {shlex.quote(root)} \\( {prune} \\) -prune -o -type f -printf '%P\\t%s\\t%T@\\n'"
+        f" | LC_ALL=C sort > {new}.tmp && mv {new}.tmp {new}"
+        f" || {{ rm -f {new}.tmp; echo {SNAPSHOT_FAILED}; exit 1; }}",
+    ]
+    if since is not None:
+        old = f"{manifest_dir}/{since}"
+        lines.append(
+            f"if [ -f {old} ]; then awk -F'\\t' {shlex.quote(_DIFF_AWK)} {old} {new}; "
+            f"else echo {UNKNOWN_TOKEN}; fi"
+        )
+    lines.append(f"cd {manifest_dir} && ls -t | tail -n +{keep + 1} | xargs -r rm -f")
+    return "\n".join(lines)
+
+
+def parse_changes_output(output: str,
+                         token: str,
+                         since: Optional[str] = None,
+                         root: Optional[str] = None) -> Dict:
+    """
+    Turn A/M/D lines into {"token", "added", "modified", "deleted"}.
+    """
+    delta = {"token": token, "added": [], "modified": [], "deleted": []}
+    keys = {"A": "added", "M": "modified", "D": "deleted"}
+    for line in (output or "").splitlines():
+        if line.strip() == UNKNOWN_TOKEN:
+            raise ChangesTokenExpired(
+                f"Unknown or expired changes token for {root}: {since}, new baseline token: {token}",
+                token=token)
+        if line.strip() == UNKNOWN_ROOT:
+            raise ValueError(f"Changes root is not a directory: {root}")
+        if line.strip() == SNAPSHOT_FAILED:
+            # exec clients that do not report exit codes (kubernetes) land here
+            raise RuntimeError(f"Failed to snapshot workspace manifest:\n{output.strip()}")
+        kind, _, path = line.partition("\t")
+        if kind in keys and path:
+            delta[keys[kind]].append(path)
+    for key in keys.values():
+        delta[key].sort()
+    return delta